@@ -1,5 +1,13 @@
+import threading
+import time
 import requests
 
+FUND_LIST_TTL = 6 * 60 * 60  # seconds; the mfapi.in scheme list changes rarely
+REQUEST_TIMEOUT = 30  # seconds; callers wait on _fund_list_lock while a refresh runs
+
+_fund_list_lock = threading.Lock()
+_fund_list_cache = {"fetched_at": 0.0, "funds": None}
+
 def generate_recommendation(age, income, profession, region, goal):
     if goal == "Wealth Accumulation":
         equity_pct, debt_pct, gold_pct = 70, 20, 10
@@ -42,13 +50,27 @@ def generate_recommendation(age, income, profession, region, goal):
     }
 
 
+def get_fund_list():
+    # Shared by every search in the process instead of downloading the full
+    # scheme list on each query. The lock makes concurrent callers wait for a
+    # single refresh.
+    with _fund_list_lock:
+        if _fund_list_cache["funds"] is None or time.time() - _fund_list_cache["fetched_at"] > FUND_LIST_TTL:
+            response = requests.get("https://api.mfapi.in/mf", timeout=REQUEST_TIMEOUT)
+            response.raise_for_status()
+            _fund_list_cache["funds"] = response.json()
+            _fund_list_cache["fetched_at"] = time.time()
+        return _fund_list_cache["funds"]
+
+
+def match_funds(mf_list, query):
+    return [mf for mf in mf_list if query.lower() in mf["schemeName"].lower()]
+
+
 def search_funds(query):
     search_results = []
     try:
-        mf_list = requests.get("https://api.mfapi.in/mf").json()
-        for mf in mf_list:
-            if query.lower() in mf["schemeName"].lower():
-                search_results.append(mf)
+        search_results = match_funds(get_fund_list(), query)
     except Exception:
         search_results.append({"schemeName": "Unable to fetch results. Check your internet or API."})
     return search_results
@@ -6,10 +6,7 @@ import os
 import requests
 import google.generativeai as genai
 from pypdf import PdfReader
-from fredapi import Fred
-import yfinance as yf
 from datetime import datetime, timedelta
-import numpy as np
 
 
 # Your JavaScript block at the top, immediately after st.set_page_config
@@ -26,6 +23,12 @@ js_placeholder.markdown("""
 # Assuming 'advisor' module exists and contains these functions
 # Make sure 'advisor.py' is in the same directory as this app.py
 from advisor import generate_recommendation, search_funds
+from fundamentals import load_fundamentals, compute_ratios, rank_peers
+from data_sources import (
+    fetch_fred_series, fetch_financial_news, fetch_company_statement,
+    fetch_market_data, summarize_market_data, refresh_concurrently
+)
+from statement_parser import parse_transactions_csv, parse_statement_text, analyze_portfolio
 
 # IMPORTANT: st.set_page_config MUST be the first Streamlit command
 st.set_page_config(page_title="AI Financial Advisor", layout="centered")
@@ -149,6 +152,8 @@ if st.sidebar.button("Latest Financial News"):
     st.markdown("<script>scrollToElement('financial_news')</script>", unsafe_allow_html=True)
 if st.sidebar.button("Company Financials"):
     st.markdown("<script>scrollToElement('company_financials')</script>", unsafe_allow_html=True)
+if st.sidebar.button("Peer Comparison"):
+    st.markdown("<script>scrollToElement('peer_comparison')</script>", unsafe_allow_html=True)
 if st.sidebar.button("AI Summary"):
     st.markdown("<script>scrollToElement('ai_summary')</script>", unsafe_allow_html=True)
 if st.sidebar.button("Ask the AI"):
@@ -174,12 +179,8 @@ def get_pdf_text(pdf_file):
 def get_fred_data(series_id, start_date=None, end_date=None):
     try:
         fred_api_key = st.secrets["fred"]["api_key"]
-        fred = Fred(api_key=fred_api_key)
-        data = fred.get_series(series_id, observation_start=start_date, observation_end=end_date)
-        if data is not None and not data.empty:
-            df = pd.DataFrame(data)
-            df.columns = [series_id]
-            df.index.name = 'Date'
+        df = fetch_fred_series(series_id, fred_api_key, start_date=start_date, end_date=end_date)
+        if df is not None:
             return df
         else:
             st.warning(f"No data found for FRED Series ID: `{series_id}`. Please check the ID.")
@@ -195,18 +196,7 @@ def get_fred_data(series_id, start_date=None, end_date=None):
 def get_financial_news(query="finance OR economy OR stock market OR investing", language="en", page_size=5):
     try:
         news_api_key = st.secrets["newsapi"]["api_key"]
-        url = (
-            f"https://newsapi.org/v2/everything?"
-            f"q={query}&"
-            f"language={language}&"
-            f"sortBy=publishedAt&"
-            f"pageSize={page_size}&"
-            f"apiKey={news_api_key}"
-        )
-        response = requests.get(url)
-        response.raise_for_status() # Raise an HTTPError for bad responses (4xx or 5xx)
-        articles = response.json().get("articles", [])
-        return articles
+        return fetch_financial_news(news_api_key, query=query, language=language, page_size=page_size)
     except KeyError:
         st.error("NewsAPI API key not found in Streamlit secrets. Please set it as `newsapi.api_key`.")
         return []
@@ -221,29 +211,12 @@ def get_financial_news(query="finance OR economy OR stock market OR investing",
 def get_company_financials(symbol, statement_type="INCOME_STATEMENT"):
     try:
         av_api_key = st.secrets["alphavantage"]["api_key"]
-        url = f"https://www.alphavantage.co/query?function={statement_type}&symbol={symbol}&apikey={av_api_key}"
-        response = requests.get(url)
-        response.raise_for_status()
-        data = response.json()
-
-        if "annualReports" in data:
-            st.subheader(f"Annual {statement_type.replace('_', ' ').title()} for {symbol}")
-            df = pd.DataFrame(data["annualReports"])
-            numeric_cols = [col for col in df.columns if col not in ['fiscalDateEnding', 'reportedCurrency']]
-            for col in numeric_cols:
-                df[col] = pd.to_numeric(df[col], errors='coerce')
-
-            desired_order = ['fiscalDateEnding', 'reportedCurrency', 'totalRevenue', 'netIncome', 'earningsPerShare', 'totalShareholderEquity']
-            ordered_cols = [col for col in desired_order if col in df.columns] + \
-                           [col for col in df.columns if col not in desired_order]
-            df = df[ordered_cols]
-
-            st.dataframe(df.set_index('fiscalDateEnding'))
-            return df
-        elif "Note" in data:
-            st.warning(f"Alpha Vantage API note for {symbol}: {data['Note']}. This often indicates a rate limit, an invalid symbol, or no data for the requested function.")
-        else:
-            st.warning(f"No {statement_type.replace('_', ' ').lower()} data found for {symbol}. Check the symbol or API key.")
+        df = fetch_company_statement(symbol, statement_type, av_api_key)
+        st.subheader(f"Annual {statement_type.replace('_', ' ').title()} for {symbol}")
+        st.dataframe(df.set_index('fiscalDateEnding'))
+        return df
+    except ValueError as e:
+        st.warning(f"Alpha Vantage returned no {statement_type.replace('_', ' ').lower()} for {symbol} ({e}). This often indicates a rate limit, an invalid symbol, or no data for the requested function.")
         return None
     except KeyError:
         st.error("Alpha Vantage API key not found in Streamlit secrets. Please add `alphavantage.api_key` to .streamlit/secrets.toml or Streamlit Cloud secrets.")
@@ -256,6 +229,125 @@ def get_company_financials(symbol, statement_type="INCOME_STATEMENT"):
         return None
 
 
+# --- AI Summary snapshots ---
+# Each section stores what it fetched in st.session_state['ai_summary_data'] via
+# these helpers, so the section buttons and "Refresh All and Summarize" agree.
+SUMMARY_REFRESH_DEADLINE = 20  # seconds
+
+def fund_search_snapshot(query, funds):
+    if not funds:
+        return {"query": query, "results": "No funds found."}
+    found_funds_info = [f"{fund['schemeName']} (Code: {fund.get('schemeCode', 'N/A')})" for fund in funds[:5]]
+    return {"query": query, "results": f"Found {len(funds)} funds. Top 5: {', '.join(found_funds_info)}"}
+
+def fred_snapshot(series_id, fred_df):
+    if fred_df is None:
+        return {"series_id": series_id, "data_summary": "No data retrieved."}
+    return {"series_id": series_id, "data_summary": f"Latest 5 observations for {series_id}:\n" + fred_df.tail().to_markdown()}
+
+def market_snapshot(ticker, start, end, data):
+    return {"ticker": ticker, "date_range": f"{start} to {end}", "data_summary": summarize_market_data(data)}
+
+def news_snapshot(articles):
+    if not articles:
+        return {"number_of_articles": 0, "articles_summary": "No news articles fetched."}
+    news_summary_list = [
+        f"Title: {article.get('title', 'N/A')}, Source: {article.get('source', {}).get('name', 'N/A')}, Description: {(article.get('description') or 'N/A')[:150]}..."
+        for article in articles
+    ]
+    return {"number_of_articles": len(articles), "articles_summary": "\n".join(news_summary_list)}
+
+def company_snapshot(ticker, statement_type, company_df):
+    # to_markdown needs tabulate installed
+    head = company_df.head().to_markdown() if company_df is not None else "No data found."
+    return {"ticker": ticker, "statement_type": statement_type, "financial_data_head": head}
+
+def build_summary_prompt(summary_data):
+    summary_prompt_parts = []
+    summary_prompt_parts.append("You are an expert Indian financial advisor providing a summary and commentary. Below are outputs generated from various financial tools. Please consolidate this information, identify key insights, and provide actionable commentary. If a feature was not used, ignore it. Focus on the most relevant financial implications.\n\n")
+
+    for feature_name, data in summary_data.items():
+        summary_prompt_parts.append(f"--- {feature_name} Output ---")
+        if feature_name == "Investment Plan":
+            summary_prompt_parts.append(f"User Inputs: {data['user_inputs']}")
+            summary_prompt_parts.append(f"AI Advice: {data['advice']}")
+            summary_prompt_parts.append(f"Allocation: {data['allocation']}")
+        elif feature_name == "Mutual Fund Research":
+            summary_prompt_parts.append(f"Search Query: {data['query']}")
+            summary_prompt_parts.append(f"Results: {data['results']}")
+        elif feature_name == "Document Analysis":
+            summary_prompt_parts.append(f"Document Question: {data['document_question']}")
+            summary_prompt_parts.append(f"AI's Analysis: {data['ai_response']}")
+        elif feature_name == "Portfolio Holdings":
+            summary_prompt_parts.append(f"Totals: {data['totals']}")
+            summary_prompt_parts.append(f"Holdings:\n{data['holdings']}")
+            summary_prompt_parts.append(f"Actual vs Target Allocation:\n{data['allocation']}")
+        elif feature_name == "FRED Data":
+            summary_prompt_parts.append(f"FRED Series ID: {data['series_id']}")
+            summary_prompt_parts.append(f"Data Summary:\n{data['data_summary']}")
+        elif feature_name == "Market Trend Visualization":
+            summary_prompt_parts.append(f"Ticker: {data['ticker']}")
+            summary_prompt_parts.append(f"Date Range: {data['date_range']}")
+            summary_prompt_parts.append(f"Summary: {data['data_summary']}")
+        elif feature_name == "Financial News":
+            summary_prompt_parts.append(f"Number of Articles: {data['number_of_articles']}")
+            summary_prompt_parts.append(f"Articles:\n{data['articles_summary']}")
+        elif feature_name == "Company Financials":
+            summary_prompt_parts.append(f"Company Ticker: {data['ticker']}")
+            summary_prompt_parts.append(f"Statement Type: {data['statement_type']}")
+            summary_prompt_parts.append(f"Financial Data (Head):\n{data['financial_data_head']}")
+        elif feature_name == "Peer Comparison":
+            summary_prompt_parts.append(f"Company Tickers: {data['tickers']}")
+            summary_prompt_parts.append(f"Peer Ranking:\n{data['ranking']}")
+        elif feature_name == "Direct AI Question":
+            summary_prompt_parts.append(f"User Question: {data['question']}")
+            summary_prompt_parts.append(f"AI Response: {data['ai_response']}")
+        summary_prompt_parts.append("\n")
+
+    return "\n".join(summary_prompt_parts)
+
+def show_ai_summary(summary_data):
+    try:
+        genai.configure(api_key=st.secrets["gemini"]["api_key"])
+    except KeyError:
+        st.error("Gemini API key not found in Streamlit secrets. Please set it as `gemini.api_key` in .streamlit/secrets.toml or Streamlit Cloud secrets.")
+        st.stop()
+
+    model = genai.GenerativeModel('gemini-1.5-flash')
+    full_summary_prompt = build_summary_prompt(summary_data)
+
+    with st.spinner("Generating AI Summary..."):
+        try:
+            summary_response = model.generate_content(contents=[{"role": "user", "parts": [full_summary_prompt]}])
+            st.subheader("📝 Consolidated AI Summary and Commentary:")
+            st.markdown(f"<p style='color: white;'>{summary_response.text}</p>", unsafe_allow_html=True)
+        except Exception as e:
+            st.error(f"Error generating AI Summary: {e}. This might be due to API token limits or other issues. Try reducing the amount of data generated by the features, or simplify your previous requests.")
+
+def secret_or_none(section):
+    try:
+        return st.secrets[section]["api_key"]
+    except KeyError:
+        return None
+
+def require_key(api_key, section):
+    if api_key is None:
+        raise KeyError(f"`{section}.api_key` not found in Streamlit secrets")
+    return api_key
+
+# search_funds and yf.download report failures as results rather than exceptions;
+# turn those into errors so a refresh keeps the previous snapshot instead.
+def require_market_data(data):
+    if data.empty:
+        raise LookupError("no market data returned")
+    return data
+
+def require_fund_results(funds):
+    if funds and "schemeCode" not in funds[0]:
+        raise ConnectionError(funds[0]["schemeName"])
+    return funds
+
+
 st.title("💸 AI Financial Advisor")
 
 
@@ -303,32 +395,26 @@ st.header("🔍 Mutual Fund Research")
 search_query = st.text_input("Enter fund name to search", key="fund_search_input")
 if search_query:
     funds = search_funds(search_query)
-    found_funds_info = []
     if funds:
         for fund in funds[:5]:
             st.markdown(f"<p style='color: white;'><b>{fund['schemeName']}</b></p>", unsafe_allow_html=True)
             st.markdown(f"<p style='color: white;'>Scheme Code: {fund.get('schemeCode', 'N/A')}</p>", unsafe_allow_html=True)
             st.markdown(f"<p style='color: white;'>[Live NAV](https://api.mfapi.in/mf/{fund.get('schemeCode', '')})</p>", unsafe_allow_html=True)
-            found_funds_info.append(f"{fund['schemeName']} (Code: {fund.get('schemeCode', 'N/A')})")
-        # --- Capture for AI Summary ---
-        st.session_state['ai_summary_data']['Mutual Fund Research'] = {
-            "query": search_query,
-            "results": f"Found {len(funds)} funds. Top 5: {', '.join(found_funds_info)}"
-        }
     else:
         st.markdown("<p style='color: white;'>No funds found for your query.</p>", unsafe_allow_html=True)
-        st.session_state['ai_summary_data']['Mutual Fund Research'] = {
-            "query": search_query,
-            "results": "No funds found."
-        }
+    # --- Capture for AI Summary (a failed search keeps the previous snapshot) ---
+    try:
+        st.session_state['ai_summary_data']['Mutual Fund Research'] = fund_search_snapshot(search_query, require_fund_results(funds))
+    except ConnectionError:
+        pass
 st.markdown("---")
 
 
 # --- Document Analyzer Section ---
 st.markdown("<div id='document_analyzer'></div>", unsafe_allow_html=True) # Anchor for scrolling
 st.header("📄 Document Analyzer")
-st.write("Upload a document (PDF or TXT) for the AI to analyze and provide advice.")
-uploaded_file = st.file_uploader("Choose a file", type=["pdf", "txt"], key="doc_uploader")
+st.write("Upload a document (PDF, TXT or a CSV transaction export) for the AI to analyze and provide advice.")
+uploaded_file = st.file_uploader("Choose a file", type=["pdf", "txt", "csv"], key="doc_uploader")
 
 document_text = ""
 if uploaded_file is not None:
@@ -337,11 +423,11 @@ if uploaded_file is not None:
     if file_extension == ".pdf":
         st.info("Extracting text from PDF... This may take a moment for large files.")
         document_text = get_pdf_text(uploaded_file)
-    elif file_extension == ".txt":
-        st.info("Reading text from TXT file...")
+    elif file_extension in (".txt", ".csv"):
+        st.info(f"Reading text from {file_extension[1:].upper()} file...")
         document_text = uploaded_file.getvalue().decode("utf-8")
     else:
-        st.warning("Unsupported file type. Please upload a PDF or TXT file.")
+        st.warning("Unsupported file type. Please upload a PDF, TXT or CSV file.")
 
     if document_text:
         st.subheader("Extracted Document Text (Preview)")
@@ -350,6 +436,43 @@ if uploaded_file is not None:
             preview_text += "\n\n... (Document truncated for preview. Full content sent to AI.)"
         st.text_area("Document Content", preview_text, height=300, disabled=True)
 
+        st.markdown("---")
+        st.subheader("Holdings, XIRR and Allocation")
+        st.write("For a consolidated account statement or transaction export: value your holdings against the latest NAVs and compare them with your Investment Plan allocation.")
+
+        if st.button("Analyze Holdings", key="analyze_holdings_btn"):
+            try:
+                if file_extension == ".csv":
+                    transactions_df = parse_transactions_csv(document_text)
+                else:
+                    transactions_df = parse_statement_text(document_text)
+            except ValueError as e:
+                st.warning(f"Could not read transactions from this document: {e}")
+                transactions_df = None
+
+            if transactions_df is not None:
+                with st.spinner("Valuing holdings against latest NAVs..."):
+                    recommendation = generate_recommendation(age, income, profession, region, goal)
+                    portfolio = analyze_portfolio(transactions_df, recommendation)
+
+                holdings_df = portfolio["holdings"]
+                portfolio_xirr = portfolio["portfolio_xirr"]
+                xirr_text = f"{portfolio_xirr:.2%}" if not pd.isna(portfolio_xirr) else "N/A"
+                st.write(f"Parsed {len(transactions_df):,} transactions across {transactions_df['folio'].nunique()} folios.")
+                if transactions_df.attrs.get("dropped_rows"):
+                    st.warning(f"Skipped {transactions_df.attrs['dropped_rows']:,} rows without a valid date, scheme or amount.")
+                st.write(f"Invested: ₹{portfolio['total_invested']:,.0f} | Current Value: ₹{portfolio['total_value']:,.0f} | Portfolio XIRR: {xirr_text}")
+                st.dataframe(holdings_df)
+                st.subheader(f"Actual vs Target Allocation ({goal})")
+                st.dataframe(portfolio["allocation"].round(2))
+
+                # --- Capture for AI Summary ---
+                st.session_state['ai_summary_data']['Portfolio Holdings'] = {
+                    "totals": f"Invested: {portfolio['total_invested']:.0f}, Current Value: {portfolio['total_value']:.0f}, Portfolio XIRR: {xirr_text}",
+                    "holdings": holdings_df[["value", "gain", "xirr", "asset_class"]].round(3).to_markdown(),
+                    "allocation": portfolio["allocation"].round(2).to_markdown()
+                }
+
         st.markdown("---")
         st.subheader("Ask AI about this Document")
         document_question = st.text_area("What do you want to know or analyze about this document?", key="doc_ai_question_area")
@@ -408,18 +531,10 @@ if st.button("Get FRED Data", key="fetch_fred_data_btn"):
             if fred_df is not None:
                 st.subheader(f"Latest Data for {fred_series_id}")
                 st.dataframe(fred_df.tail())
-
-                # --- Capture for AI Summary ---
-                st.session_state['ai_summary_data']['FRED Data'] = {
-                    "series_id": fred_series_id,
-                    "data_summary": f"Latest 5 observations for {fred_series_id}:\n" + fred_df.tail().to_markdown()
-                }
             else:
                 st.info("No data could be retrieved for the provided FRED Series ID.")
-                st.session_state['ai_summary_data']['FRED Data'] = {
-                    "series_id": fred_series_id,
-                    "data_summary": "No data retrieved."
-                }
+            # --- Capture for AI Summary ---
+            st.session_state['ai_summary_data']['FRED Data'] = fred_snapshot(fred_series_id, fred_df)
     else:
         st.warning("Please enter a FRED Series ID to fetch data.")
 st.markdown("---")
@@ -452,49 +567,18 @@ if st.button("Get Market Data", key="get_market_data_btn"): # Changed button tex
         with st.spinner(f"Fetching historical data for {market_ticker}..."):
             try:
                 # Fetch data using yfinance
-                data = yf.download(market_ticker, start=chart_start_date, end=chart_end_date)
+                data = fetch_market_data(market_ticker, chart_start_date, chart_end_date)
 
                 if data.empty:
                     st.warning(f"No historical data found for '{market_ticker}' in the specified date range ({chart_start_date} to {chart_end_date}). This could be due to an incorrect ticker, an unsupported date range, or no trading activity.")
-                    st.session_state['ai_summary_data']['Market Trend Visualization'] = {
-                        "ticker": market_ticker,
-                        "date_range": f"{chart_start_date} to {chart_end_date}",
-                        "data_summary": "No data found."
-                    }
                 else:
                     st.write("--- Raw Data Fetched (Head) ---")
-                    # Explicitly convert columns to numeric and fill NaNs for robust display
-                    for col in ['Open', 'High', 'Low', 'Close', 'Adj Close', 'Volume']:
-                        if col in data.columns:
-                            data[col] = pd.to_numeric(data[col], errors='coerce') # Convert to numeric, non-convertible become NaN
-                            data[col] = data[col].fillna(0) # Fill NaN with 0 for display (or another suitable value)
-
                     st.dataframe(data.head()) # Show the first few rows of data to verify
                     st.write("--- Raw Data Fetched (Tail) ---")
                     st.dataframe(data.tail()) # Also show tail to give more context if data is large
                     st.write("-----------------------------")
 
-                    # Extract values, handling potential empty Series (will be None)
-                    # Now that data is pre-cleaned, this check is even more reliable.
-                    first_open = data['Open'].iloc[0] if not data['Open'].empty else None
-                    last_close = data['Close'].iloc[-1] if not data['Close'].empty else None
-                    max_high = data['High'].max() if not data['High'].empty else None
-                    min_low = data['Low'].min() if not data['Low'].empty else None
-
-
-                    summary_parts = [f"Fetched {len(data)} data points."]
-                    # FIXED: More robust check for both None and np.nan before formatting
-                    # Now that data is pre-cleaned, this check is even more reliable.
-                    summary_parts.append(f"Start Open: {first_open:.2f}" if first_open is not None and not np.isnan(first_open) else "Start Open: N/A")
-                    summary_parts.append(f"End Close: {last_close:.2f}" if last_close is not None and not np.isnan(last_close) else "End Close: N/A")
-                    summary_parts.append(f"Max High: {max_high:.2f}" if max_high is not None and not np.isnan(max_high) else "Max High: N/A")
-                    summary_parts.append(f"Min Low: {min_low:.2f}" if min_low is not None and not np.isnan(min_low) else "Min Low: N/A")
-
-                    st.session_state['ai_summary_data']['Market Trend Visualization'] = {
-                        "ticker": market_ticker,
-                        "date_range": f"{chart_start_date} to {chart_end_date}",
-                        "data_summary": ", ".join(summary_parts)
-                    }
+                st.session_state['ai_summary_data']['Market Trend Visualization'] = market_snapshot(market_ticker, chart_start_date, chart_end_date, data)
 
             except Exception as e:
                 st.error(f"An error occurred while fetching market data for {market_ticker}: {e}. Please ensure the ticker is correct and try again with a valid date range.")
@@ -516,7 +600,6 @@ st.write("Current top financial headlines from around the world.")
 if st.button("Refresh News", key="refresh_news_btn"):
     with st.spinner("Fetching latest news..."):
         articles = get_financial_news(query="finance OR economy OR stock market OR investing", language="en", page_size=5)
-        news_summary_list = []
         if articles:
             for i, article in enumerate(articles):
                 st.subheader(f"{i+1}. {article.get('title', 'No Title')}")
@@ -532,18 +615,10 @@ if st.button("Refresh News", key="refresh_news_btn"):
                 st.write(article.get('description', 'No description available.'))
                 st.markdown(f"[Read Full Article]({article.get('url', '#')})")
                 st.markdown("---")
-                news_summary_list.append(f"Title: {article.get('title', 'N/A')}, Source: {article.get('source', {}).get('name', 'N/A')}, Description: {article.get('description', 'N/A')[:150]}...")
-            # --- Capture for AI Summary ---
-            st.session_state['ai_summary_data']['Financial News'] = {
-                "number_of_articles": len(articles),
-                "articles_summary": "\n".join(news_summary_list)
-            }
         else:
             st.info("Could not fetch financial news at this moment. Please try again later.")
-            st.session_state['ai_summary_data']['Financial News'] = {
-                "number_of_articles": 0,
-                "articles_summary": "No news articles fetched."
-            }
+        # --- Capture for AI Summary ---
+        st.session_state['ai_summary_data']['Financial News'] = news_snapshot(articles)
 st.markdown("---")
 
 
@@ -567,24 +642,63 @@ if st.button("Get Company Financials", key="get_company_financials_btn"):
     if company_ticker_av:
         with st.spinner(f"Fetching {statement_type_selected.replace('_', ' ').lower()} for {company_ticker_av}..."):
             company_df = get_company_financials(company_ticker_av, statement_type=statement_type_selected)
-            if company_df is not None:
-                # --- Capture for AI Summary ---
-                st.session_state['ai_summary_data']['Company Financials'] = {
-                    "ticker": company_ticker_av,
-                    "statement_type": statement_type_selected,
-                    "financial_data_head": company_df.head().to_markdown() # Ensure tabulate is installed for this to work
-                }
-            else:
-                st.session_state['ai_summary_data']['Company Financials'] = {
-                    "ticker": company_ticker_av,
-                    "statement_type": statement_type_selected,
-                    "financial_data_head": "No data found."
-                }
+            # --- Capture for AI Summary ---
+            st.session_state['ai_summary_data']['Company Financials'] = company_snapshot(company_ticker_av, statement_type_selected, company_df)
     else:
         st.warning("Please enter a company stock ticker.")
 st.markdown("---")
 
 
+# --- Peer Comparison Section ---
+st.markdown("<div id='peer_comparison'></div>", unsafe_allow_html=True) # Anchor for scrolling
+st.header("🏁 Peer Comparison")
+st.write("Compare margins, ROE, leverage, growth and cash conversion across a set of companies. Statements already fetched are reused from cache.")
+
+peer_tickers_input = st.text_input(
+    "Enter Company Tickers, comma separated (e.g., IBM, MSFT, ORCL):",
+    key="peer_tickers_input"
+)
+peer_tickers = list(dict.fromkeys(t.strip().upper() for t in peer_tickers_input.split(",") if t.strip()))
+
+if st.button("Compare Peers", key="compare_peers_btn"):
+    if peer_tickers:
+        try:
+            av_api_key = st.secrets["alphavantage"]["api_key"]
+        except KeyError:
+            st.error("Alpha Vantage API key not found in Streamlit secrets. Please add `alphavantage.api_key` to .streamlit/secrets.toml or Streamlit Cloud secrets.")
+            st.stop()
+
+        with st.spinner(f"Loading statements for {len(peer_tickers)} companies..."):
+            fundamentals_df, peer_errors = load_fundamentals(peer_tickers, av_api_key)
+
+        for ticker, error in peer_errors.items():
+            st.warning(f"Incomplete data for {ticker}: {error}")
+
+        if not fundamentals_df.empty:
+            ratios_df = compute_ratios(fundamentals_df)
+            ranking_df = rank_peers(ratios_df)
+
+            st.subheader("Peer Ranking (Latest Fiscal Year)")
+            st.dataframe(ranking_df)
+            with st.expander("All Years"):
+                st.dataframe(ratios_df)
+
+            # --- Capture for AI Summary ---
+            st.session_state['ai_summary_data']['Peer Comparison'] = {
+                "tickers": ", ".join(peer_tickers),
+                "ranking": ranking_df.round(3).to_markdown()
+            }
+        else:
+            st.info("No financial statements could be retrieved for the provided tickers.")
+            st.session_state['ai_summary_data']['Peer Comparison'] = {
+                "tickers": ", ".join(peer_tickers),
+                "ranking": "No data found."
+            }
+    else:
+        st.warning("Please enter at least one company ticker.")
+st.markdown("---")
+
+
 # --- AI Summary Section ---
 st.markdown("<div id='ai_summary'></div>", unsafe_allow_html=True) # Anchor for scrolling
 st.header("🧠 AI Summary")
@@ -594,57 +708,45 @@ if st.button("Generate AI Summary", key="generate_ai_summary_btn"):
     if not st.session_state['ai_summary_data']:
         st.info("No data has been generated by the features yet. Please use the features above first.")
     else:
-        try:
-            genai.configure(api_key=st.secrets["gemini"]["api_key"])
-        except KeyError:
-            st.error("Gemini API key not found in Streamlit secrets. Please set it as `gemini.api_key` in .streamlit/secrets.toml or Streamlit Cloud secrets.")
-            st.stop()
+        show_ai_summary(st.session_state['ai_summary_data'])
 
-        model = genai.GenerativeModel('gemini-1.5-flash')
+st.write(f"Or refetch FRED, market data, news, company financials and fund search together using the inputs above, then summarize. Sections that don't respond within {SUMMARY_REFRESH_DEADLINE} seconds use their last saved data.")
 
-        summary_prompt_parts = []
-        summary_prompt_parts.append("You are an expert Indian financial advisor providing a summary and commentary. Below are outputs generated from various financial tools. Please consolidate this information, identify key insights, and provide actionable commentary. If a feature was not used, ignore it. Focus on the most relevant financial implications.\n\n")
-
-        for feature_name, data in st.session_state['ai_summary_data'].items():
-            summary_prompt_parts.append(f"--- {feature_name} Output ---")
-            if feature_name == "Investment Plan":
-                summary_prompt_parts.append(f"User Inputs: {data['user_inputs']}")
-                summary_prompt_parts.append(f"AI Advice: {data['advice']}")
-                summary_prompt_parts.append(f"Allocation: {data['allocation']}")
-            elif feature_name == "Mutual Fund Research":
-                summary_prompt_parts.append(f"Search Query: {data['query']}")
-                summary_prompt_parts.append(f"Results: {data['results']}")
-            elif feature_name == "Document Analysis":
-                summary_prompt_parts.append(f"Document Question: {data['document_question']}")
-                summary_prompt_parts.append(f"AI's Analysis: {data['ai_response']}")
-            elif feature_name == "FRED Data":
-                summary_prompt_parts.append(f"FRED Series ID: {data['series_id']}")
-                summary_prompt_parts.append(f"Data Summary:\n{data['data_summary']}")
-            elif feature_name == "Market Trend Visualization":
-                summary_prompt_parts.append(f"Ticker: {data['ticker']}")
-                summary_prompt_parts.append(f"Date Range: {data['date_range']}")
-                summary_prompt_parts.append(f"Summary: {data['data_summary']}")
-            elif feature_name == "Financial News":
-                summary_prompt_parts.append(f"Number of Articles: {data['number_of_articles']}")
-                summary_prompt_parts.append(f"Articles:\n{data['articles_summary']}")
-            elif feature_name == "Company Financials":
-                summary_prompt_parts.append(f"Company Ticker: {data['ticker']}")
-                summary_prompt_parts.append(f"Statement Type: {data['statement_type']}")
-                summary_prompt_parts.append(f"Financial Data (Head):\n{data['financial_data_head']}")
-            elif feature_name == "Direct AI Question":
-                summary_prompt_parts.append(f"User Question: {data['question']}")
-                summary_prompt_parts.append(f"AI Response: {data['ai_response']}")
-            summary_prompt_parts.append("\n")
-
-        full_summary_prompt = "\n".join(summary_prompt_parts)
-
-        with st.spinner("Generating AI Summary..."):
-            try:
-                summary_response = model.generate_content(contents=[{"role": "user", "parts": [full_summary_prompt]}])
-                st.subheader("📝 Consolidated AI Summary and Commentary:")
-                st.markdown(f"<p style='color: white;'>{summary_response.text}</p>", unsafe_allow_html=True)
-            except Exception as e:
-                st.error(f"Error generating AI Summary: {e}. This might be due to API token limits or other issues. Try reducing the amount of data generated by the features, or simplify your previous requests.")
+if st.button("Refresh All and Summarize", key="refresh_all_summary_btn"):
+    # Each job runs the section's own fetch in a worker thread; nothing in them
+    # touches st.*, so keys are read here on the script thread.
+    news_key, fred_key, av_key = secret_or_none("newsapi"), secret_or_none("fred"), secret_or_none("alphavantage")
+    refresh_jobs = {
+        "Financial News": lambda: news_snapshot(fetch_financial_news(require_key(news_key, "newsapi"))),
+    }
+    if fred_series_id:
+        refresh_jobs["FRED Data"] = lambda: fred_snapshot(
+            fred_series_id, fetch_fred_series(fred_series_id, require_key(fred_key, "fred")))
+    if market_ticker:
+        refresh_jobs["Market Trend Visualization"] = lambda: market_snapshot(
+            market_ticker, chart_start_date, chart_end_date,
+            require_market_data(fetch_market_data(market_ticker, chart_start_date, chart_end_date)))
+    if company_ticker_av:
+        refresh_jobs["Company Financials"] = lambda: company_snapshot(
+            company_ticker_av, statement_type_selected,
+            fetch_company_statement(company_ticker_av, statement_type_selected, require_key(av_key, "alphavantage"), refresh=True))
+    if search_query:
+        refresh_jobs["Mutual Fund Research"] = lambda: fund_search_snapshot(search_query, require_fund_results(search_funds(search_query)))
+
+    with st.spinner(f"Refreshing {len(refresh_jobs)} sections..."):
+        fresh_data, failed_sections = refresh_concurrently(refresh_jobs, SUMMARY_REFRESH_DEADLINE)
+    st.session_state['ai_summary_data'].update(fresh_data)
+
+    for section, reason in failed_sections.items():
+        if section in st.session_state['ai_summary_data']:
+            st.warning(f"{section}: refresh failed ({reason}). Using previously fetched data.")
+        else:
+            st.warning(f"{section}: refresh failed ({reason}). Leaving it out of the summary.")
+
+    if st.session_state['ai_summary_data']:
+        show_ai_summary(st.session_state['ai_summary_data'])
+    else:
+        st.info("No data could be fetched for the summary. Please check your API keys and inputs above.")
 
 st.markdown("---") # End of AI Summary Section
 
@@ -0,0 +1,448 @@
+"""Headless JSON API for the advisor functions.
+
+Run locally with:
+
+    python api_service.py --port 8080
+
+The service keeps no per-client state; caches are per process, so any number of
+instances can sit behind a load balancer. API keys come from the environment
+(FRED_API_KEY, NEWSAPI_API_KEY, ALPHAVANTAGE_API_KEY, GEMINI_API_KEY) or from
+.streamlit/secrets.toml, the same file the Streamlit app reads.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+
+import pandas as pd
+import requests
+from aiohttp import web
+
+from advisor import generate_recommendation, get_fund_list, match_funds
+from fundamentals import (
+    STATEMENT_TYPES, load_fundamentals, compute_ratios, rank_peers, UpstreamDataError, request_error_message
+)
+from statement_parser import parse_transactions_csv, parse_statement_text, analyze_portfolio
+from data_sources import (
+    MissingAPIKeyError, get_secret, fetch_fred_series, fetch_financial_news, fetch_company_statement,
+    fetch_market_data, summarize_market_data, generate_ai_text
+)
+
+MAX_INFLIGHT_REQUESTS = int(os.environ.get("ADVISOR_MAX_INFLIGHT", "256"))
+MAX_BATCH_SIZE = int(os.environ.get("ADVISOR_MAX_BATCH", "500"))
+CACHE_TTL = int(os.environ.get("ADVISOR_CACHE_TTL", "900"))  # seconds
+
+# How many blocking calls may be outstanding against each upstream at once.
+# Keeps a burst of client requests from tripping the providers' rate limits.
+UPSTREAM_LIMITS = {
+    "mfapi": 8,
+    "fred": 4,
+    "newsapi": 4,
+    "alphavantage": 2,
+    "yfinance": 4,
+    "gemini": 4,
+}
+
+RECOMMENDATION_FIELDS = ["age", "income", "profession", "region", "goal"]
+MAX_AGE = 150
+MAX_INCOME = 10 ** 15  # keeps the allocation arithmetic well inside float range
+
+logger = logging.getLogger("advisor_api")
+
+
+class ResponseCache:
+    """TTL cache for upstream responses that coalesces concurrent misses.
+
+    Callers asking for a key that is already being fetched await the same task
+    instead of issuing a second upstream request.
+    """
+
+    def __init__(self, ttl, max_entries=1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = {}
+        self._pending = {}
+
+    async def get_or_fetch(self, key, fetch):
+        entry = self._entries.get(key)
+        if entry is not None and time.monotonic() - entry[0] < self.ttl:
+            return entry[1]
+
+        task = self._pending.get(key)
+        if task is not None:
+            return await asyncio.shield(task)
+
+        task = asyncio.ensure_future(fetch())
+        self._pending[key] = task
+        try:
+            # Shielded so a client disconnecting does not cancel the fetch other
+            # requests are waiting on.
+            value = await asyncio.shield(task)
+        finally:
+            self._pending.pop(key, None)
+        self._entries.pop(key, None)
+        self._entries[key] = (time.monotonic(), value)
+        while len(self._entries) > self.max_entries:
+            self._entries.pop(next(iter(self._entries)))
+        return value
+
+
+async def run_upstream(app, upstream, func, *args, **kwargs):
+    async with app["upstream_limits"][upstream]:
+        return await asyncio.to_thread(func, *args, **kwargs)
+
+
+def frame_to_records(df):
+    # Round-trip through pandas' JSON writer so NaN/NaT/Timestamps become valid JSON.
+    return json.loads(df.reset_index().to_json(orient="records", date_format="iso"))
+
+
+def string_param(params, name, default=None):
+    """Return params[name] stripped, raising ValueError if it is missing or not a string."""
+    value = params.get(name, default)
+    if value is None:
+        return None
+    if not isinstance(value, str):
+        raise ValueError(f"Field '{name}' must be a string.")
+    return value.strip()
+
+
+def required_string_param(params, name):
+    value = string_param(params, name)
+    if not value:
+        raise ValueError(f"Missing field: {name}")
+    return value
+
+
+def number_param(params, name, maximum):
+    """Return params[name], raising ValueError unless it is a JSON number in [0, maximum]."""
+    value = params.get(name)
+    # bool is an int subclass; NaN and infinities fail the range check.
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not 0 <= value <= maximum:
+        raise ValueError(f"Field '{name}' must be a number between 0 and {maximum}.")
+    return value
+
+
+def int_param(params, name, default):
+    """Return params[name] as a positive int (query strings arrive as text)."""
+    value = params.get(name, default)
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Field '{name}' must be an integer.") from None
+    if value < 1:
+        raise ValueError(f"Field '{name}' must be at least 1.")
+    return value
+
+
+# --- Operations ---
+# Each operation takes the app and a params dict and returns a JSON-serializable
+# dict. They back both the single endpoints and /batch.
+
+async def op_recommendation(app, params):
+    if not isinstance(params, dict):
+        raise ValueError("Profile must be a JSON object.")
+    missing = [field for field in RECOMMENDATION_FIELDS if field not in params]
+    if missing:
+        raise ValueError(f"Missing fields: {', '.join(missing)}")
+    return generate_recommendation(
+        number_param(params, "age", MAX_AGE),
+        number_param(params, "income", MAX_INCOME),
+        required_string_param(params, "profession"),
+        required_string_param(params, "region"),
+        required_string_param(params, "goal"),
+    )
+
+
+async def op_search_funds(app, params):
+    query = required_string_param(params, "query")
+    limit = int_param(params, "limit", 20)
+    # get_fund_list raises on an mfapi.in outage (mapped to 502); search_funds would
+    # swallow it into a placeholder result.
+    funds = match_funds(await run_upstream(app, "mfapi", get_fund_list), query)
+    return {"query": query, "count": len(funds), "results": funds[:limit]}
+
+
+async def op_fred(app, params):
+    series_id = required_string_param(params, "series_id").upper()
+    start_date, end_date = string_param(params, "start_date"), string_param(params, "end_date")
+
+    async def fetch():
+        df = await run_upstream(app, "fred", fetch_fred_series, series_id, get_secret("fred"),
+                                start_date=start_date, end_date=end_date)
+        return None if df is None else frame_to_records(df)
+
+    records = await app["cache"].get_or_fetch(("fred", series_id, start_date, end_date), fetch)
+    if records is None:
+        raise LookupError(f"No data found for FRED Series ID: {series_id}")
+    return {"series_id": series_id, "observations": records}
+
+
+async def op_market(app, params):
+    ticker = required_string_param(params, "ticker").upper()
+    start_date, end_date = string_param(params, "start_date"), string_param(params, "end_date")
+
+    async def fetch():
+        data = await run_upstream(app, "yfinance", fetch_market_data, ticker, start_date, end_date)
+        if data.empty:
+            return None
+        return {"summary": summarize_market_data(data), "prices": frame_to_records(data)}
+
+    result = await app["cache"].get_or_fetch(("market", ticker, start_date, end_date), fetch)
+    if result is None:
+        raise LookupError(f"No historical data found for {ticker}")
+    return {"ticker": ticker, **result}
+
+
+async def op_news(app, params):
+    query = string_param(params, "query", "finance OR economy OR stock market OR investing")
+    page_size = int_param(params, "page_size", 5)
+
+    async def fetch():
+        return await run_upstream(app, "newsapi", fetch_financial_news, get_secret("newsapi"),
+                                  query=query, page_size=page_size)
+
+    articles = await app["cache"].get_or_fetch(("news", query, page_size), fetch)
+    return {"query": query, "articles": articles}
+
+
+async def op_company_financials(app, params):
+    symbol = required_string_param(params, "symbol").upper()
+    statement_type = string_param(params, "statement_type", "INCOME_STATEMENT").upper()
+    if statement_type not in STATEMENT_TYPES:
+        raise ValueError(f"Field 'statement_type' must be one of: {', '.join(STATEMENT_TYPES)}")
+    # Statements are cached inside fundamentals, shared with /peers.
+    df = await run_upstream(app, "alphavantage", fetch_company_statement,
+                            symbol, statement_type, get_secret("alphavantage"))
+    return {"symbol": symbol, "statement_type": statement_type,
+            "annual_reports": frame_to_records(df.set_index("fiscalDateEnding"))}
+
+
+async def op_peers(app, params):
+    symbols = params.get("symbols", [])
+    if not isinstance(symbols, list) or not all(isinstance(s, str) for s in symbols):
+        raise ValueError("Field 'symbols' must be a list of strings.")
+    symbols = list(dict.fromkeys(s.strip().upper() for s in symbols if s.strip()))
+    if not symbols:
+        raise ValueError("Missing field: symbols")
+    fundamentals_df, errors = await run_upstream(app, "alphavantage", load_fundamentals,
+                                                 symbols, get_secret("alphavantage"))
+    if fundamentals_df.empty:
+        return {"symbols": symbols, "ranking": [], "errors": errors}
+    ranking = rank_peers(compute_ratios(fundamentals_df))
+    return {"symbols": symbols, "ranking": frame_to_records(ranking), "errors": errors}
+
+
+async def op_portfolio(app, params):
+    csv_text, statement_text = string_param(params, "csv_text"), string_param(params, "statement_text")
+    if csv_text:
+        parse, text = parse_transactions_csv, csv_text
+    elif statement_text:
+        parse, text = parse_statement_text, statement_text
+    else:
+        raise ValueError("Missing field: csv_text or statement_text")
+    profile = params.get("profile")
+    recommendation = await op_recommendation(app, profile) if profile else None
+
+    def parse_and_analyze():
+        # Parsing may download the mfapi.in scheme list to fill in missing codes and
+        # analysis fetches NAVs, so both stay off the event loop.
+        transactions = parse(text)
+        return transactions, analyze_portfolio(transactions, recommendation)
+
+    transactions, portfolio = await run_upstream(app, "mfapi", parse_and_analyze)
+    allocation = portfolio["allocation"]
+    return {
+        "transactions": len(transactions),
+        "dropped_rows": transactions.attrs.get("dropped_rows", 0),
+        "total_invested": portfolio["total_invested"],
+        "total_value": portfolio["total_value"],
+        "portfolio_xirr": None if pd.isna(portfolio["portfolio_xirr"]) else portfolio["portfolio_xirr"],
+        "holdings": frame_to_records(portfolio["holdings"]),
+        "allocation": None if allocation is None else frame_to_records(allocation.rename_axis("asset_class")),
+    }
+
+
+async def op_analyze(app, params):
+    question = required_string_param(params, "question")
+    document_text = string_param(params, "document_text")
+    if document_text:
+        prompt = (
+            f"You are a helpful and expert Indian financial advisor. Analyze the following document and provide advice/answers based on the user's question.\n\n"
+            f"--- Document Content ---\n{document_text}\n\n"
+            f"--- User Question ---\n{question}\n\n"
+            f"--- Financial Advice/Analysis ---"
+        )
+    else:
+        prompt = (
+            "You are a helpful and expert Indian financial advisor. Provide a concise and accurate answer to the following question. "
+            "If the question is not financial, answer generally but remind the user this is a financial advisor tool. "
+            "Keep answers focused and professional.\n\n"
+            f"User: {question}\n\n"
+            "AI Advisor:"
+        )
+    text = await run_upstream(app, "gemini", generate_ai_text, prompt, get_secret("gemini"))
+    return {"question": question, "ai_response": text}
+
+
+OPERATIONS = {
+    "recommendation": op_recommendation,
+    "search_funds": op_search_funds,
+    "fred": op_fred,
+    "market": op_market,
+    "news": op_news,
+    "company_financials": op_company_financials,
+    "peers": op_peers,
+    "portfolio": op_portfolio,
+    "analyze": op_analyze,
+}
+
+
+def error_status(e):
+    if isinstance(e, MissingAPIKeyError):
+        return 503
+    if isinstance(e, (UpstreamDataError, requests.exceptions.RequestException)):
+        return 502
+    if isinstance(e, ValueError):
+        return 400
+    if isinstance(e, LookupError) and not isinstance(e, KeyError):
+        return 404
+    return 500
+
+
+def error_message(e):
+    if isinstance(e, MissingAPIKeyError):
+        return f"API key not configured: {e}"
+    if isinstance(e, requests.exceptions.RequestException):
+        return request_error_message(e)
+    if error_status(e) == 500:
+        return "Internal server error."  # details are logged, not sent to the client
+    return str(e)
+
+
+async def run_operation(app, name, params):
+    """Run one operation and return (status, body) without raising."""
+    operation = OPERATIONS.get(name)
+    if operation is None:
+        return 404, {"error": f"Unknown operation: {name}"}
+    if not isinstance(params, dict):
+        return 400, {"error": "Operation params must be a JSON object."}
+    try:
+        return 200, await operation(app, params)
+    except Exception as e:
+        status = error_status(e)
+        if status == 500:
+            logger.exception("Operation %s failed", name)
+        return status, {"error": error_message(e)}
+
+
+async def read_json(request):
+    try:
+        body = await request.json()
+    except json.JSONDecodeError:
+        raise web.HTTPBadRequest(text=json.dumps({"error": "Request body must be JSON."}),
+                                 content_type="application/json")
+    if not isinstance(body, dict):
+        raise web.HTTPBadRequest(text=json.dumps({"error": "Request body must be a JSON object."}),
+                                 content_type="application/json")
+    return body
+
+
+# --- HTTP handlers ---
+
+def operation_handler(name, from_query=False):
+    async def handler(request):
+        params = dict(request.query) if from_query else await read_json(request)
+        params.update(request.match_info)
+        status, body = await run_operation(request.app, name, params)
+        return web.json_response(body, status=status)
+    return handler
+
+
+def batch_items(body, key):
+    items = body.get(key)
+    if not isinstance(items, list):
+        raise ValueError(f"Field '{key}' must be a list.")
+    if len(items) > MAX_BATCH_SIZE:
+        raise ValueError(f"Batch too large: {len(items)} items (max {MAX_BATCH_SIZE}).")
+    return items
+
+
+async def gather_batch(app, calls):
+    results = await asyncio.gather(*(run_operation(app, name, params) for name, params in calls))
+    return [{"status": status, **({"result": body} if status == 200 else body)} for status, body in results]
+
+
+async def handle_batch(request):
+    """Run a list of {"op": ..., "params": {...}} concurrently; one result per item, in order."""
+    body = await read_json(request)
+    try:
+        items = batch_items(body, "requests")
+        calls = [(item.get("op"), item.get("params", {})) for item in items]
+    except (ValueError, AttributeError) as e:
+        return web.json_response({"error": str(e)}, status=400)
+    return web.json_response({"results": await gather_batch(request.app, calls)})
+
+
+async def handle_recommendation_batch(request):
+    body = await read_json(request)
+    try:
+        items = batch_items(body, "profiles")
+    except ValueError as e:
+        return web.json_response({"error": str(e)}, status=400)
+    results = await gather_batch(request.app, [("recommendation", item) for item in items])
+    return web.json_response({"results": results})
+
+
+async def handle_search_funds_batch(request):
+    body = await read_json(request)
+    try:
+        queries = batch_items(body, "queries")
+    except ValueError as e:
+        return web.json_response({"error": str(e)}, status=400)
+    results = await gather_batch(request.app, [("search_funds", {"query": q}) for q in queries])
+    return web.json_response({"results": results})
+
+
+async def handle_health(request):
+    return web.json_response({"status": "ok"})
+
+
+@web.middleware
+async def inflight_limit(request, handler):
+    # Queue rather than reject: excess requests wait for a slot, which keeps a
+    # single instance from overcommitting threads while the load balancer spreads load.
+    async with request.app["inflight"]:
+        return await handler(request)
+
+
+def create_app():
+    app = web.Application(middlewares=[inflight_limit], client_max_size=20 * 1024 * 1024)
+    app["inflight"] = asyncio.Semaphore(MAX_INFLIGHT_REQUESTS)
+    app["upstream_limits"] = {name: asyncio.Semaphore(limit) for name, limit in UPSTREAM_LIMITS.items()}
+    app["cache"] = ResponseCache(CACHE_TTL)
+
+    app.router.add_get("/health", handle_health)
+    app.router.add_post("/recommendation", operation_handler("recommendation"))
+    app.router.add_post("/recommendation/batch", handle_recommendation_batch)
+    app.router.add_get("/funds/search", operation_handler("search_funds", from_query=True))
+    app.router.add_post("/funds/search/batch", handle_search_funds_batch)
+    app.router.add_get("/fred/{series_id}", operation_handler("fred", from_query=True))
+    app.router.add_get("/market/{ticker}", operation_handler("market", from_query=True))
+    app.router.add_get("/news", operation_handler("news", from_query=True))
+    app.router.add_get("/company/{symbol}/financials", operation_handler("company_financials", from_query=True))
+    app.router.add_post("/company/peers", operation_handler("peers"))
+    app.router.add_post("/portfolio", operation_handler("portfolio"))
+    app.router.add_post("/analyze", operation_handler("analyze"))
+    app.router.add_post("/batch", handle_batch)
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the AI Financial Advisor JSON API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    args = parser.parse_args()
+    web.run_app(create_app(), host=args.host, port=args.port)
@@ -0,0 +1,119 @@
+"""Throughput benchmark for api_service.py.
+
+    python benchmark_api.py --spawn                      # start a local server and benchmark it
+    python benchmark_api.py --url http://127.0.0.1:8080  # benchmark an already running server
+
+The default scenario posts recommendation batches, which need no API keys, so the
+numbers measure the service itself rather than the upstream providers.
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+
+import aiohttp
+
+GOALS = ["Wealth Accumulation", "Retirement Planning", "Short-term Savings", "Tax Saving (ELSS)"]
+
+
+def recommendation_profile(i):
+    return {"age": 25 + i % 40, "income": 30000 + 1000 * (i % 50), "profession": "Salaried",
+            "region": "Metro", "goal": GOALS[i % len(GOALS)]}
+
+
+def build_request(scenario, i, batch_size):
+    if scenario == "recommendation":
+        return "POST", "/recommendation", recommendation_profile(i)
+    if scenario == "recommendation-batch":
+        return "POST", "/recommendation/batch", {"profiles": [recommendation_profile(i + j) for j in range(batch_size)]}
+    if scenario == "search":
+        return "GET", "/funds/search?query=" + ["index", "liquid", "gold", "bluechip"][i % 4], None
+    return "GET", "/health", None
+
+
+async def wait_for_server(url, timeout=30):
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        while time.monotonic() < deadline:
+            try:
+                async with session.get(url + "/health") as response:
+                    if response.status == 200:
+                        return
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"Server at {url} did not become healthy within {timeout}s")
+
+
+async def run_benchmark(url, scenario, total_requests, concurrency, batch_size):
+    latencies = []
+    errors = 0
+    next_index = 0
+
+    async def worker(session):
+        nonlocal errors, next_index
+        while next_index < total_requests:
+            i = next_index
+            next_index += 1
+            method, path, payload = build_request(scenario, i, batch_size)
+            started = time.perf_counter()
+            try:
+                async with session.request(method, url + path, json=payload) as response:
+                    await response.read()
+                    if response.status != 200:
+                        errors += 1
+            except aiohttp.ClientError:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        # Warm up connections and any server-side caches before timing.
+        async def warm_up():
+            async with session.get(url + "/health") as response:
+                await response.read()
+        await asyncio.gather(*(warm_up() for _ in range(concurrency)))
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(session) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    items = total_requests * (batch_size if scenario == "recommendation-batch" else 1)
+    print(f"Scenario:     {scenario} ({total_requests} requests, concurrency {concurrency})")
+    print(f"Elapsed:      {elapsed:.2f}s")
+    print(f"Throughput:   {total_requests / elapsed:,.0f} req/s ({items / elapsed:,.0f} items/s)")
+    print(f"Latency p50:  {latencies[len(latencies) // 2] * 1000:.1f} ms")
+    print(f"Latency p95:  {latencies[int(len(latencies) * 0.95)] * 1000:.1f} ms")
+    print(f"Errors:       {errors}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the AI Financial Advisor JSON API.")
+    parser.add_argument("--url", default="http://127.0.0.1:8080")
+    parser.add_argument("--spawn", action="store_true", help="start api_service.py on the --url port first")
+    parser.add_argument("--scenario", default="recommendation-batch",
+                        choices=["health", "recommendation", "recommendation-batch", "search"])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--batch-size", type=int, default=50)
+    args = parser.parse_args()
+    url = args.url.rstrip("/")
+
+    server = None
+    if args.spawn:
+        port = url.rsplit(":", 1)[-1]
+        service_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "api_service.py")
+        server = subprocess.Popen([sys.executable, service_path, "--port", port])
+    try:
+        asyncio.run(wait_for_server(url))
+        asyncio.run(run_benchmark(url, args.scenario, args.requests, args.concurrency, args.batch_size))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
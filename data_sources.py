@@ -0,0 +1,134 @@
+import os
+import tomllib
+from concurrent.futures import ThreadPoolExecutor, wait
+import requests
+import numpy as np
+import pandas as pd
+import yfinance as yf
+import google.generativeai as genai
+from fredapi import Fred
+
+from fundamentals import REQUEST_TIMEOUT, fetch_statement
+
+SECRETS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".streamlit", "secrets.toml")
+GEMINI_MODEL = "gemini-1.5-flash"
+
+
+class MissingAPIKeyError(KeyError):
+    """Raised by get_secret; a KeyError so callers handle it like a missing st.secrets entry."""
+
+
+def get_secret(section, key="api_key"):
+    """Look up a secret outside Streamlit.
+
+    Checks the environment first (e.g. FRED_API_KEY for section "fred") and falls back
+    to .streamlit/secrets.toml. Raises MissingAPIKeyError when it is missing.
+    """
+    env_value = os.environ.get(f"{section}_{key}".upper())
+    if env_value:
+        return env_value
+    if os.path.exists(SECRETS_PATH):
+        with open(SECRETS_PATH, "rb") as f:
+            secrets = tomllib.load(f)
+        if key in secrets.get(section, {}):
+            return secrets[section][key]
+    raise MissingAPIKeyError(f"{section}.{key}")
+
+
+def fetch_fred_series(series_id, api_key, start_date=None, end_date=None):
+    fred = Fred(api_key=api_key)
+    data = fred.get_series(series_id, observation_start=start_date, observation_end=end_date)
+    if data is None or data.empty:
+        return None
+    df = pd.DataFrame(data)
+    df.columns = [series_id]
+    df.index.name = 'Date'
+    return df
+
+
+def fetch_financial_news(api_key, query="finance OR economy OR stock market OR investing", language="en", page_size=5):
+    params = {
+        "q": query,
+        "language": language,
+        "sortBy": "publishedAt",
+        "pageSize": page_size,
+        "apiKey": api_key,
+    }
+    response = requests.get("https://newsapi.org/v2/everything", params=params, timeout=REQUEST_TIMEOUT)
+    response.raise_for_status() # Raise an HTTPError for bad responses (4xx or 5xx)
+    return response.json().get("articles", [])
+
+
+def fetch_company_statement(symbol, statement_type, api_key, refresh=False):
+    # Goes through the fundamentals cache, so a statement already loaded for a
+    # peer comparison is not downloaded again unless refresh is set.
+    df = pd.DataFrame(fetch_statement(symbol, statement_type, api_key, refresh=refresh))
+    numeric_cols = [col for col in df.columns if col not in ['fiscalDateEnding', 'reportedCurrency']]
+    df[numeric_cols] = df[numeric_cols].apply(pd.to_numeric, errors='coerce')
+
+    desired_order = ['fiscalDateEnding', 'reportedCurrency', 'totalRevenue', 'netIncome', 'earningsPerShare', 'totalShareholderEquity']
+    ordered_cols = [col for col in desired_order if col in df.columns] + \
+                   [col for col in df.columns if col not in desired_order]
+    return df[ordered_cols]
+
+
+def fetch_market_data(ticker, start_date, end_date):
+    data = yf.download(ticker, start=start_date, end=end_date)
+    # Recent yfinance returns (field, ticker) columns even for one ticker; flatten
+    # them so data['Close'] is a Series.
+    if isinstance(data.columns, pd.MultiIndex):
+        data.columns = data.columns.get_level_values(0)
+    # Explicitly convert columns to numeric and fill NaNs for robust display
+    for col in ['Open', 'High', 'Low', 'Close', 'Adj Close', 'Volume']:
+        if col in data.columns:
+            data[col] = pd.to_numeric(data[col], errors='coerce').fillna(0)
+    return data
+
+
+def summarize_market_data(data):
+    if data.empty:
+        return "No data found."
+
+    first_open = data['Open'].iloc[0] if not data['Open'].empty else None
+    last_close = data['Close'].iloc[-1] if not data['Close'].empty else None
+    max_high = data['High'].max() if not data['High'].empty else None
+    min_low = data['Low'].min() if not data['Low'].empty else None
+
+    summary_parts = [f"Fetched {len(data)} data points."]
+    summary_parts.append(f"Start Open: {first_open:.2f}" if first_open is not None and not np.isnan(first_open) else "Start Open: N/A")
+    summary_parts.append(f"End Close: {last_close:.2f}" if last_close is not None and not np.isnan(last_close) else "End Close: N/A")
+    summary_parts.append(f"Max High: {max_high:.2f}" if max_high is not None and not np.isnan(max_high) else "Max High: N/A")
+    summary_parts.append(f"Min Low: {min_low:.2f}" if min_low is not None and not np.isnan(min_low) else "Min Low: N/A")
+    return ", ".join(summary_parts)
+
+
+def generate_ai_text(prompt, api_key):
+    genai.configure(api_key=api_key)
+    model = genai.GenerativeModel(GEMINI_MODEL)
+    response = model.generate_content(contents=[{"role": "user", "parts": [prompt]}])
+    return response.text
+
+
+def refresh_concurrently(jobs, deadline):
+    """Run {name: callable} in parallel and return (results, failures).
+
+    Returns as soon as every job has finished or `deadline` seconds have passed. Jobs
+    still running at the deadline are reported in failures and left to finish in the
+    background; their results are discarded.
+    """
+    if not jobs:
+        return {}, {}
+    pool = ThreadPoolExecutor(max_workers=len(jobs))
+    futures = {pool.submit(job): name for name, job in jobs.items()}
+    done, not_done = wait(futures, timeout=deadline)
+    pool.shutdown(wait=False, cancel_futures=True)
+
+    results, failures = {}, {}
+    for future in done:
+        try:
+            results[futures[future]] = future.result()
+        except Exception as e:
+            failures[futures[future]] = str(e) or type(e).__name__
+    for future in not_done:
+        failures[futures[future]] = f"missed the {deadline}s deadline"
+    return results, failures
@@ -0,0 +1,158 @@
+import threading
+import time
+import requests
+import numpy as np
+import pandas as pd
+
+STATEMENT_TYPES = ["INCOME_STATEMENT", "BALANCE_SHEET", "CASH_FLOW"]
+STATEMENT_CACHE_TTL = 6 * 60 * 60  # seconds; filings change at most quarterly
+STATEMENT_CACHE_MAX_ENTRIES = 1024
+REQUEST_TIMEOUT = 30  # seconds
+
+# Columns needed to compute the peer ratios. Anything missing from a
+# company's filings is reindexed in as NaN so the math stays vectorized.
+RATIO_INPUTS = [
+    "totalRevenue", "grossProfit", "operatingIncome", "netIncome",
+    "totalAssets", "totalLiabilities", "totalShareholderEquity", "shortLongTermDebtTotal",
+    "operatingCashflow", "capitalExpenditures",
+]
+
+# Metric -> True if a higher value ranks better.
+RANKING_METRICS = {
+    "grossMargin": True,
+    "operatingMargin": True,
+    "netMargin": True,
+    "roe": True,
+    "debtToEquity": False,
+    "revenueGrowth": True,
+    "netIncomeGrowth": True,
+    "cashConversion": True,
+    "fcfMargin": True,
+}
+
+# (symbol, statement_type) -> (fetched_at, list of annual reports). Shared by Streamlit
+# reruns and API requests so repeated peer sets reuse earlier downloads.
+_statement_lock = threading.Lock()
+_statement_cache = {}
+
+
+class UpstreamDataError(ValueError):
+    """Alpha Vantage answered but without usable data (rate-limit note, unknown symbol)."""
+
+
+def request_error_message(e):
+    # requests includes the full URL, API key and all, in its messages; report the status only.
+    status = getattr(getattr(e, "response", None), "status_code", None)
+    return f"Upstream request failed (HTTP {status})." if status else f"Upstream request failed ({type(e).__name__})."
+
+
+def fetch_statement(symbol, statement_type, api_key, refresh=False):
+    key = (symbol, statement_type)
+    with _statement_lock:
+        entry = _statement_cache.get(key)
+    if not refresh and entry is not None and time.monotonic() - entry[0] < STATEMENT_CACHE_TTL:
+        return entry[1]
+
+    response = requests.get(
+        "https://www.alphavantage.co/query",
+        params={"function": statement_type, "symbol": symbol, "apikey": api_key},
+        timeout=REQUEST_TIMEOUT,
+    )
+    response.raise_for_status()
+    data = response.json()
+
+    if "annualReports" in data:
+        with _statement_lock:
+            _statement_cache.pop(key, None)
+            _statement_cache[key] = (time.monotonic(), data["annualReports"])
+            while len(_statement_cache) > STATEMENT_CACHE_MAX_ENTRIES:
+                _statement_cache.pop(next(iter(_statement_cache)))
+        return data["annualReports"]
+    elif "Note" in data:
+        raise UpstreamDataError(f"Alpha Vantage API note: {data['Note']}")
+    raise UpstreamDataError(f"No {statement_type.replace('_', ' ').lower()} data found.")
+
+
+def load_fundamentals(symbols, api_key):
+    """Return (fundamentals, errors) for a list of tickers.
+
+    fundamentals is indexed by (symbol, fiscalDateEnding) with one numeric column per
+    line item across the income statement, balance sheet and cash flow. errors maps
+    each ticker that could not be fully loaded to the reason.
+    """
+    statements = {statement_type: [] for statement_type in STATEMENT_TYPES}
+    errors = {}
+    for symbol in symbols:
+        for statement_type in STATEMENT_TYPES:
+            try:
+                reports = fetch_statement(symbol, statement_type, api_key)
+            except (requests.exceptions.RequestException, ValueError) as e:
+                reason = request_error_message(e) if isinstance(e, requests.exceptions.RequestException) else str(e)
+                errors[symbol] = "; ".join(filter(None, [errors.get(symbol), f"{statement_type}: {reason}"]))
+                continue
+            df = pd.DataFrame(reports)
+            df["symbol"] = symbol
+            statements[statement_type].append(df)
+
+    frames = []
+    for statement_type in STATEMENT_TYPES:
+        if statements[statement_type]:
+            df = pd.concat(statements[statement_type], ignore_index=True)
+            df["fiscalDateEnding"] = pd.to_datetime(df["fiscalDateEnding"], errors="coerce")
+            frames.append(df.drop(columns=["reportedCurrency"], errors="ignore")
+                            .set_index(["symbol", "fiscalDateEnding"]))
+
+    if not frames:
+        return pd.DataFrame(), errors
+
+    # Line items such as netIncome appear on more than one statement; keep the first.
+    fundamentals = pd.concat(frames, axis=1)
+    fundamentals = fundamentals.loc[:, ~fundamentals.columns.duplicated()]
+    fundamentals = fundamentals.apply(pd.to_numeric, errors="coerce").sort_index()
+    return fundamentals, errors
+
+
+def compute_ratios(fundamentals):
+    f = fundamentals.reindex(columns=RATIO_INPUTS).sort_index()
+    revenue = f["totalRevenue"]
+    # ROE and leverage are meaningless on negative equity (a loss would show as a
+    # high ROE and deficit equity as the lowest leverage), so leave them out.
+    equity = f["totalShareholderEquity"].where(f["totalShareholderEquity"] > 0)
+    # Likewise for cash conversion and income growth measured against a loss year.
+    net_income = f["netIncome"].where(f["netIncome"] > 0)
+    free_cash_flow = f["operatingCashflow"] - f["capitalExpenditures"]
+    by_symbol = f.groupby(level="symbol")
+    prior_net_income = by_symbol["netIncome"].shift()
+
+    ratios = pd.DataFrame({
+        "grossMargin": f["grossProfit"] / revenue,
+        "operatingMargin": f["operatingIncome"] / revenue,
+        "netMargin": f["netIncome"] / revenue,
+        "roe": f["netIncome"] / equity,
+        "debtToEquity": f["shortLongTermDebtTotal"] / equity,
+        "liabilitiesToAssets": f["totalLiabilities"] / f["totalAssets"],
+        "revenueGrowth": by_symbol["totalRevenue"].pct_change(fill_method=None),
+        "netIncomeGrowth": (f["netIncome"] - prior_net_income) / prior_net_income.where(prior_net_income > 0),
+        "cashConversion": f["operatingCashflow"] / net_income,
+        "freeCashFlow": free_cash_flow,
+        "fcfMargin": free_cash_flow / revenue,
+    }, index=f.index)
+    return ratios.replace([np.inf, -np.inf], np.nan)
+
+
+def rank_peers(ratios, metrics=None):
+    """Rank each company's latest fiscal year against the peer set.
+
+    Every metric is turned into a percentile rank (1.0 = best in the set) and the
+    composite score is the mean of the available ranks.
+    """
+    metrics = metrics or list(RANKING_METRICS)
+    latest = ratios.groupby(level="symbol").tail(1).reset_index(level="fiscalDateEnding")
+
+    ranks = pd.DataFrame({
+        metric: latest[metric].rank(ascending=RANKING_METRICS.get(metric, True), pct=True)
+        for metric in metrics
+    })
+    ranked = latest[["fiscalDateEnding"] + metrics].copy()
+    ranked["score"] = ranks.mean(axis=1)
+    return ranked.sort_values("score", ascending=False)
@@ -0,0 +1,354 @@
+import io
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import requests
+
+from advisor import REQUEST_TIMEOUT, get_fund_list
+
+NAV_CACHE_TTL = 60 * 60  # seconds; mfapi.in publishes NAVs once a day
+XIRR_LOWER_BOUND = -0.9999
+# Upper ends tried, in turn, when bracketing a rate for bisection.
+XIRR_UPPER_BOUNDS = [1.0, 10.0, 100.0, 1e3, 1e4, 1e5, 1e6]
+
+# Canonical transaction columns and their dtypes.
+TRANSACTION_DTYPES = {
+    "date": "datetime64[ns]",
+    "folio": "category",
+    "scheme_code": "string",
+    "scheme_name": "category",
+    "transaction_type": "category",
+    "amount": "float64",  # signed: + invested, - redeemed
+    "units": "float64",   # signed: + allotted, - redeemed
+    "nav": "float64",
+}
+
+# Header spellings seen in RTA / platform transaction exports.
+CSV_COLUMN_ALIASES = {
+    "date": ["date", "transaction date", "trade date", "txn date"],
+    "folio": ["folio", "folio no", "folio number"],
+    "scheme_code": ["scheme code", "amfi code", "amfi", "code"],
+    "scheme_name": ["scheme", "scheme name", "fund", "fund name"],
+    "transaction_type": ["type", "transaction type", "transaction", "description"],
+    "amount": ["amount", "amount (inr)", "value"],
+    "units": ["units", "quantity"],
+    "nav": ["nav", "price", "nav (inr)"],
+}
+
+CURRENCY_PATTERN = r"(?i)rs\.?|inr|₹"
+REDEMPTION_PATTERN = r"redeem|redemption|switch[- ]?out|sell|sale|withdraw|swp|transfer[- ]?out|payout"
+
+ASSET_CLASS_PATTERNS = [
+    ("Gold", r"gold"),
+    ("Debt", r"debt|liquid|gilt|bond|income|money market|overnight|corporate|banking (?:&|and) psu|credit|duration|treasury|floater|fixed maturity"),
+]
+
+# Consolidated account statement (CAS) text, as returned by get_pdf_text.
+CAS_FOLIO_RE = r"Folio\s*No\s*[:.]?\s*(?P<folio>\d[\d/ ]*\d|\d)"
+# The AMFI code either ends the scheme name ("... Growth (AMFI: 119091)") or follows later on the line.
+CAS_SCHEME_RE = (
+    r"^(?:[A-Z0-9]+-)?(?P<scheme_name>.+?)\s*"
+    r"(?:-\s*ISIN|\(AMFI\s*:?\s*(?P<scheme_code>\d+)|\(Advisor|Registrar)"
+    r"(?:.*?AMFI\s*:?\s*(?P<trailing_code>\d+))?"
+)
+CAS_TRANSACTION_RE = (
+    r"^(?P<date>\d{2}-[A-Za-z]{3}-\d{4})\s+(?P<transaction_type>.+?)\s+"
+    r"(?P<amount>\(?-?[\d,]+\.\d+\)?)\s+(?P<units>\(?-?[\d,]+\.\d+\)?)\s+"
+    r"(?P<nav>[\d,]+\.\d+)\s+[\d,]+\.\d+\s*$"
+)
+
+_nav_lock = threading.Lock()
+_nav_cache = {}  # scheme_code -> (fetched_at, nav, nav_date)
+
+
+def _to_number(series):
+    # Handles "1,234.50", "₹ 500", "Rs.500" and accounting-style "(1,234.50)" in one pass.
+    # Currency markers go first so the "." in "Rs." is not read as a decimal point.
+    text = series.astype("string").str.replace(CURRENCY_PATTERN, "", regex=True).str.strip()
+    negative = text.str.startswith("(").fillna(False)
+    values = pd.to_numeric(text.str.replace(r"[^\d.\-]", "", regex=True), errors="coerce").astype("float64")
+    return values.where(~negative, -values.abs())
+
+
+def _finalize_transactions(df):
+    df = df.reindex(columns=list(TRANSACTION_DTYPES))
+    # dayfirst would turn ISO 2024-03-05 into 3 May, so only dd-mm / dd-Mon dates get it.
+    dates = df["date"].astype("string").str.strip()
+    iso = dates.str.match(r"\d{4}-\d{2}-\d{2}").fillna(False).astype(bool)
+    df["date"] = pd.to_datetime(dates.where(iso), errors="coerce", format="ISO8601").fillna(
+        pd.to_datetime(dates.where(~iso), errors="coerce", format="mixed", dayfirst=True))
+    for col in ["amount", "units", "nav"]:
+        df[col] = _to_number(df[col])
+    df["units"] = df["units"].fillna(df["amount"].abs() / df["nav"].where(df["nav"] > 0))
+
+    # Exports disagree on whether redemptions carry a sign, so derive it from the type.
+    redeemed = df["transaction_type"].astype("string").str.contains(REDEMPTION_PATTERN, case=False, regex=True).fillna(False)
+    redeemed = redeemed.astype(bool) | (df["units"] < 0) | (df["amount"] < 0)
+    sign = np.where(redeemed, -1.0, 1.0)
+    df["amount"] = df["amount"].abs() * sign
+    df["units"] = df["units"].abs() * sign
+
+    # Fill in missing AMFI codes from the mfapi.in scheme list by exact name.
+    df["scheme_code"] = df["scheme_code"].astype("string").str.replace(r"\.0$", "", regex=True)
+    if df["scheme_code"].isna().any():
+        try:
+            codes = {fund["schemeName"].strip().lower(): str(fund["schemeCode"]) for fund in get_fund_list()}
+        except Exception:
+            codes = {}
+        by_name = df["scheme_name"].astype("string").str.strip().str.lower().map(codes)
+        df["scheme_code"] = df["scheme_code"].fillna(by_name.astype("string"))
+
+    n_rows = len(df)
+    df = df.dropna(subset=["date", "scheme_name", "amount"])
+    if df.empty:
+        raise ValueError("No transactions found: no row has a valid date, scheme and amount.")
+    df["nav"] = df["nav"].fillna(df["amount"].abs() / df["units"].abs())
+    df = df.astype(TRANSACTION_DTYPES).sort_values("date", ignore_index=True)
+    # Rows without a usable date, scheme or amount; callers report the count.
+    df.attrs["dropped_rows"] = n_rows - len(df)
+    return df
+
+
+def parse_transactions_csv(csv_text):
+    """Parse the text of a transaction export CSV into the typed table."""
+    df = pd.read_csv(io.StringIO(csv_text), dtype=str)
+    df.columns = df.columns.str.strip().str.lower()
+    renames = {}
+    for column, aliases in CSV_COLUMN_ALIASES.items():
+        match = next((alias for alias in aliases if alias in df.columns), None)
+        if match is not None:
+            renames[match] = column
+    df = df.rename(columns=renames)
+    missing = [col for col in ["date", "scheme_name", "amount"] if col not in df.columns]
+    if missing:
+        raise ValueError(f"CSV is missing required columns: {', '.join(missing)}")
+    if "units" not in df.columns and "nav" not in df.columns:
+        raise ValueError("CSV needs a units column, or a NAV column to derive units from.")
+    return _finalize_transactions(df)
+
+
+def parse_statement_text(text):
+    """Parse consolidated account statement text (e.g. from get_pdf_text) into the typed table."""
+    lines = pd.Series(text.splitlines(), dtype="string").str.strip()
+    transactions = lines.str.extract(CAS_TRANSACTION_RE)
+    is_transaction = transactions["date"].notna()
+
+    # Folio and scheme headers apply to every transaction line below them.
+    folios = lines.str.extract(CAS_FOLIO_RE)["folio"].str.replace(" ", "")
+    schemes = lines.where(~is_transaction).str.extract(CAS_SCHEME_RE)
+    schemes["scheme_code"] = schemes["scheme_code"].fillna(schemes["trailing_code"])
+    transactions["folio"] = folios.ffill()
+    transactions["scheme_name"] = schemes["scheme_name"].ffill()
+    # Blank the code on headers without one so it does not inherit the previous scheme's.
+    transactions["scheme_code"] = schemes["scheme_code"].mask(schemes["scheme_name"].notna() & schemes["scheme_code"].isna(), "").ffill().replace("", pd.NA)
+
+    transactions = transactions[is_transaction]
+    if transactions.empty:
+        raise ValueError("No transactions found in the statement text.")
+    return _finalize_transactions(transactions)
+
+
+def _fetch_latest_nav(scheme_code):
+    response = requests.get(f"https://api.mfapi.in/mf/{scheme_code}/latest", timeout=REQUEST_TIMEOUT)
+    response.raise_for_status()
+    latest = response.json()["data"][0]
+    return float(latest["nav"]), pd.to_datetime(latest["date"], dayfirst=True)
+
+
+def get_latest_navs(scheme_codes):
+    """Return {scheme_code: (nav, nav_date)}, fetching only codes missing from the cache."""
+    now = time.time()
+    with _nav_lock:
+        stale = [code for code in scheme_codes if code not in _nav_cache or now - _nav_cache[code][0] > NAV_CACHE_TTL]
+
+    if stale:
+        def fetch(code):
+            try:
+                return code, _fetch_latest_nav(code)
+            except Exception:
+                return code, None
+
+        with ThreadPoolExecutor(max_workers=min(8, len(stale))) as pool:
+            for code, result in pool.map(fetch, stale):
+                if result is not None:
+                    with _nav_lock:
+                        _nav_cache[code] = (now, *result)
+
+    with _nav_lock:
+        return {code: _nav_cache[code][1:] for code in scheme_codes if code in _nav_cache}
+
+
+def _scaled_npv(rates, group_ids, years, last_year, cashflows):
+    # The NPV times a positive factor picked so no discount term exceeds 1: discount to
+    # the first flow when the rate is non-negative, compound to the last flow when it is
+    # negative. Nothing overflows near -100% or at huge rates, and the sign is unchanged.
+    base = 1.0 + rates[group_ids]
+    exponent = np.where(base >= 1.0, -years, last_year[group_ids] - years)
+    return np.bincount(group_ids, weights=cashflows * base ** exponent, minlength=len(rates))
+
+
+def xirr(group_ids, dates, cashflows, guess=0.1, tol=1e-7, max_iter=100):
+    """Solve XIRR for many cash-flow series at once.
+
+    group_ids are integer codes 0..n-1, cashflows are negative for money invested and
+    positive for money received. All groups take Newton steps together on flat arrays,
+    so the cost is a handful of numpy passes regardless of how many funds there are.
+    Groups Newton does not solve are bracketed and bisected, again all at once.
+    Returns an array of annual rates with NaN where a group's NPV never changes sign.
+    """
+    group_ids = np.asarray(group_ids)
+    cashflows = np.asarray(cashflows, dtype=float)
+    days = np.asarray(dates, dtype="datetime64[D]").astype(np.int64)
+    n_groups = group_ids.max() + 1
+
+    first_day = np.full(n_groups, np.iinfo(np.int64).max)
+    np.minimum.at(first_day, group_ids, days)
+    years = (days - first_day[group_ids]) / 365.0
+    last_year = np.zeros(n_groups)
+    np.maximum.at(last_year, group_ids, years)
+
+    def npv_sign(rates):
+        return np.sign(_scaled_npv(rates, group_ids, years, last_year, cashflows))
+
+    rates = np.full(n_groups, guess)
+    active = np.ones(n_groups, dtype=bool)
+    converged = np.zeros(n_groups, dtype=bool)
+    with np.errstate(all="ignore"):
+        for _ in range(max_iter):
+            base = 1.0 + rates[group_ids]
+            discounted = cashflows * base ** -years
+            npv = np.bincount(group_ids, weights=discounted, minlength=n_groups)
+            slope = np.bincount(group_ids, weights=-years * discounted / base, minlength=n_groups)
+            step = npv / slope
+            # A non-finite step means Newton ran off where the NPV is representable;
+            # those groups stop here and go to bisection.
+            failed = active & ~np.isfinite(step)
+            converged |= active & ~failed & (np.abs(step) <= tol)
+            rates = np.where(active & ~failed, np.maximum(rates - step, XIRR_LOWER_BOUND), rates)
+            active &= ~failed & ~converged
+            if not active.any():
+                break
+
+        # A tiny step can also come from a huge slope far from any root, so only keep
+        # Newton's answer where the NPV changes sign around it.
+        margin = 10 * tol
+        solved = converged & (npv_sign(np.maximum(rates - margin, XIRR_LOWER_BOUND)) != npv_sign(rates + margin))
+
+        lo = np.full(n_groups, XIRR_LOWER_BOUND)
+        hi = np.full(n_groups, np.nan)
+        sign_lo = npv_sign(lo)
+        for upper in XIRR_UPPER_BOUNDS:
+            bracketed = np.isnan(hi) & (npv_sign(np.full(n_groups, upper)) * sign_lo < 0)
+            hi[bracketed] = upper
+        bracketed = ~solved & ~np.isnan(hi)
+        hi = np.where(bracketed, hi, lo)
+        while (hi - lo).max() > tol:
+            mid = (lo + hi) / 2
+            sign_mid = npv_sign(mid)
+            below = sign_mid == sign_lo
+            lo = np.where(below, mid, lo)
+            hi = np.where(below, hi, mid)
+
+    rates = np.where(solved, rates, np.where(bracketed, (lo + hi) / 2, np.nan))
+    # A rate only exists when a series has both outflows and inflows.
+    has_outflow = np.bincount(group_ids, weights=cashflows < 0, minlength=n_groups) > 0
+    has_inflow = np.bincount(group_ids, weights=cashflows > 0, minlength=n_groups) > 0
+    rates[~(has_outflow & has_inflow)] = np.nan
+    return rates
+
+
+def classify_asset_class(scheme_names):
+    names = pd.Series(scheme_names, dtype="string").str.lower()
+    asset_class = pd.Series("Equity", index=names.index)
+    for label, pattern in reversed(ASSET_CLASS_PATTERNS):
+        asset_class = asset_class.mask(names.str.contains(pattern, regex=True).fillna(False), label)
+    return asset_class
+
+
+def value_holdings(transactions, navs=None):
+    """Aggregate transactions into one row per fund valued at the latest NAV.
+
+    Funds without a cached/fetched NAV fall back to the last NAV in the statement.
+    """
+    grouped = transactions.groupby("scheme_name", observed=True)
+    holdings = pd.DataFrame({
+        "scheme_code": grouped["scheme_code"].first(),
+        "folios": grouped["folio"].nunique(),
+        "units": grouped["units"].sum(),
+        "invested": grouped["amount"].sum(),
+        "statement_nav": grouped["nav"].last(),
+    })
+    holdings = holdings[holdings["units"] > 1e-6]
+
+    if navs is None:
+        navs = get_latest_navs(holdings["scheme_code"].dropna().unique().tolist())
+    latest_nav = holdings["scheme_code"].map(lambda code: navs.get(code, (np.nan,))[0])
+    holdings["nav"] = latest_nav.astype("float64").fillna(holdings["statement_nav"])
+    holdings["nav_source"] = np.where(latest_nav.notna(), "mfapi.in", "statement")
+    holdings["value"] = holdings["units"] * holdings["nav"]
+    holdings["gain"] = holdings["value"] - holdings["invested"]
+    holdings["asset_class"] = classify_asset_class(holdings.index.astype(str)).to_numpy()
+    return holdings.drop(columns="statement_nav")
+
+
+def compute_xirr(transactions, holdings, as_of=None):
+    """Return (per-fund XIRR Series, whole-portfolio XIRR)."""
+    as_of = pd.Timestamp(as_of or pd.Timestamp.today().normalize())
+    flows = pd.DataFrame({
+        "scheme_name": transactions["scheme_name"].astype(str),
+        "date": transactions["date"],
+        "cashflow": -transactions["amount"],
+    })
+    # Current value is treated as a final redemption on the valuation date.
+    terminal = pd.DataFrame({
+        "scheme_name": holdings.index.astype(str),
+        "date": as_of,
+        "cashflow": holdings["value"].to_numpy(),
+    })
+    flows = pd.concat([flows, terminal], ignore_index=True)
+
+    # Fund series and the portfolio series are solved in the same Newton run;
+    # the portfolio is the last group.
+    codes, funds = pd.factorize(flows["scheme_name"])
+    portfolio_id = len(funds)
+    group_ids = np.concatenate([codes, np.full(len(flows), portfolio_id)])
+    dates = np.concatenate([flows["date"].to_numpy(), flows["date"].to_numpy()])
+    cashflows = np.tile(flows["cashflow"].to_numpy(), 2)
+
+    rates = xirr(group_ids, dates, cashflows)
+    return pd.Series(rates[:portfolio_id], index=funds, name="xirr"), rates[portfolio_id]
+
+
+def target_percentages(recommendation):
+    """Turn generate_recommendation()['allocation'] strings like '70% (~₹700)' into {class: pct}."""
+    return {asset_class: float(re.match(r"\s*([\d.]+)%", text).group(1))
+            for asset_class, text in recommendation["allocation"].items()}
+
+
+def compare_allocation(holdings, target_pct):
+    total = holdings["value"].sum()
+    actual = holdings.groupby("asset_class")["value"].sum()
+    comparison = pd.DataFrame({"target_pct": pd.Series(target_pct, dtype="float64")})
+    comparison = comparison.join(actual.rename("value"), how="outer").fillna(0.0)
+    comparison["actual_pct"] = comparison["value"] / total * 100 if total else 0.0
+    comparison["difference_pct"] = comparison["actual_pct"] - comparison["target_pct"]
+    comparison["rebalance_amount"] = comparison["target_pct"] / 100 * total - comparison["value"]
+    return comparison[["value", "actual_pct", "target_pct", "difference_pct", "rebalance_amount"]]
+
+
+def analyze_portfolio(transactions, recommendation=None, navs=None, as_of=None):
+    holdings = value_holdings(transactions, navs=navs)
+    fund_xirr, portfolio_xirr = compute_xirr(transactions, holdings, as_of=as_of)
+    holdings["xirr"] = fund_xirr.reindex(holdings.index.astype(str)).to_numpy()
+    allocation = compare_allocation(holdings, target_percentages(recommendation)) if recommendation else None
+    return {
+        "holdings": holdings,
+        "portfolio_xirr": portfolio_xirr,
+        "total_invested": holdings["invested"].sum(),
+        "total_value": holdings["value"].sum(),
+        "allocation": allocation,
+    }